@@ -0,0 +1,63 @@
+"""Builds the registry of the strategies packaged with cryptobots.
+
+The registry maps each strategy module name to its display name and
+docstring, allowing the CLI to list strategies and describe them without
+parsing every configuration file or importing every strategy module.
+Docstrings are read from the source, so the strategy dependencies do not
+need to be installed to build the registry.
+"""
+
+import os
+import ast
+import sys
+import json
+import yaml
+
+SRC_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src")
+)
+PACKAGE_DIR = os.path.join(SRC_DIR, "cryptobots")
+
+# Use the same directory and filename constants as the CLI
+sys.path.insert(0, SRC_DIR)
+from cryptobots._cli.constants import (
+    CONFIG_DIRECTORY,
+    STRATEGY_DIRECTORY,
+    REGISTRY_FILENAME,
+)
+
+
+def get_class_docstring(module_path: str, class_name: str):
+    """Returns the raw docstring of a class defined in a module."""
+    with open(module_path, "r") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            return ast.get_docstring(node, clean=False)
+
+
+def build_registry():
+    registry = {}
+    config_dir = os.path.join(PACKAGE_DIR, CONFIG_DIRECTORY)
+    for filename in sorted(os.listdir(config_dir)):
+        if not filename.endswith(".yaml"):
+            continue
+
+        with open(os.path.join(config_dir, filename), "r") as f:
+            config = yaml.safe_load(f)
+
+        module = config["MODULE"]
+        registry[module] = {
+            "name": config["NAME"],
+            "doc": get_class_docstring(
+                os.path.join(PACKAGE_DIR, STRATEGY_DIRECTORY, f"{module}.py"),
+                config["CLASS"],
+            ),
+        }
+
+    with open(os.path.join(PACKAGE_DIR, REGISTRY_FILENAME), "w") as f:
+        json.dump(registry, f, indent=2)
+
+
+if __name__ == "__main__":
+    build_registry()
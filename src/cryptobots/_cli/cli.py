@@ -1,15 +1,21 @@
 import os
+import sys
+import json
 import click
-import pickle
-from trogon import tui
+from typing import TextIO
 from cryptobots._cli import constants
-from cryptobots._cli.utilities import check_home_dir
+from cryptobots._cli.utilities import get_paths
+from datetime import datetime
 
 
-@tui(help="Open the textual terminal UI.")
-@click.group()
-def cli():
-    """The cryptobots command line interface."""
+@click.command(name="tui")
+@click.pass_context
+def tui(context: click.Context):
+    """Open the textual terminal UI."""
+    # Textual is only imported when the TUI is requested
+    from trogon import Trogon
+
+    Trogon(cli, command_name="tui", click_context=context).run()
 
 
 @click.command()
@@ -54,9 +60,12 @@ def cli():
 @click.option(
     "--launch",
     "-l",
-    help="Specify the launch file. This is used internally.",
+    type=click.File("r"),
+    help="Specify the launch file, or '-' for stdin. This is used internally.",
 )
+@click.pass_context
 def run(
+    context: click.Context,
     exchange: str,
     mode: str,
     strategy: str,
@@ -64,16 +73,14 @@ def run(
     config: str,
     background: bool,
     project: str,
-    launch: str,
+    launch: TextIO,
 ):
     """Run cryptobots."""
-    import os
-    import sys
-    import json
-    import subprocess
-    from autotrader import AutoTrader, utilities
     from cryptobots._cli.utilities import (
         print_banner,
+        confirm,
+        read_yaml,
+        cached_read_yaml,
         select_strategy,
         select_exchange_and_env,
         get_strategy_object,
@@ -82,86 +89,92 @@ def run(
         create_at_inputs,
         check_update_condition,
         save_backtest_config,
+        spawn_background,
     )
 
-    # Find home directory and configure paths
-    home_dir = check_home_dir()
-    config_dir = os.path.join(home_dir, constants.CONFIG_DIRECTORY)
-    file_dir = os.path.dirname(os.path.abspath(__file__))
-    strat_config_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.CONFIG_DIRECTORY)
-    )
-    strategy_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.STRATEGY_DIRECTORY)
-    )
-    keys_config = utilities.read_yaml(os.path.join(config_dir, constants.KEYS_FILENAME))
-    user_config_dir = os.path.normpath(
-        os.path.join(home_dir, constants.USER_CONFIG_DIRECTORY)
-    )
-    init_file = os.path.join(home_dir, constants.CONFIG_FILE)
-
-    if project:
-        # User project specified, check it has been added
-        if os.path.exists(init_file):
-            # Load existing config
-            with open(init_file, "r") as f:
-                cb_config = json.load(f)
-        else:
-            click.echo(
-                "Please complete the initialisation before trying to "
-                + "run a custom project."
-            )
-            sys.exit()
-
-        # Check
-        if "projects" not in cb_config:
-            click.echo("You have not added any projects yet!")
-            sys.exit()
-
-        else:
-            if project not in cb_config["projects"]:
-                click.echo(f"Cannot find '{project} in your projects. Add it first.")
-            else:
-                # Project found; overwrite paths
-                project_dir_path = cb_config["projects"][project]
-                strategy_dir = os.path.join(
-                    project_dir_path, constants.STRATEGY_DIRECTORY
-                )
-                strat_config_dir = os.path.join(
-                    project_dir_path, constants.CONFIG_DIRECTORY
-                )
-
-    # Check for pacakge update
-    if os.path.exists(init_file):
-        check_update_condition(init_file)
-    else:
-        click.echo("You must configure cryptobots before you can run any strategies!")
-        click.echo("Use the command 'cryptobots configure' and follow the prompts.")
-        return
-
     # Check for launch file
     ready_to_run = False
     if launch:
         # TODO - needs debugging, control verbosity and printouts.
-        # Add strategy directory to path to support unpickling configuration
-        sys.path.append(strategy_dir)
+        # Load launch configuration
+        launch_config = json.load(launch)
 
-        # Un-pickle
-        with open(launch, "rb") as f:
-            launch_config = pickle.load(f)
-
-        # Unpack
+        # Unpack, re-resolving the strategy object from its name. The home
+        # directory is taken from the launch configuration rather than from
+        # get_paths, so that nothing prompts on stdin, which carries the payload
         configure_kwargs = launch_config["configure"]
-        strategy_kwargs = launch_config["add_strategy"]
-
-        # Remove launch file
-        os.remove(launch)
+        home_dir = configure_kwargs["home_dir"]
+        _, strategy_object = get_strategy_object(
+            launch_config["strategy_name"], launch_config["strategy_dir"]
+        )
+        strategy_kwargs = {
+            **launch_config["add_strategy"],
+            "strategy": strategy_object,
+        }
 
         # Switch ready flag
         ready_to_run = True
 
     else:
-        print_banner()
+        # Find home directory and configure paths
+        paths = get_paths()
+        home_dir = paths.home_dir
+        strat_config_dir = paths.strat_config_dir
+        strategy_dir = paths.strategy_dir
+        user_config_dir = paths.user_config_dir
+        init_file = paths.init_file
+
+        if project:
+            # User project specified, check it has been added
+            try:
+                # Load existing config
+                with open(init_file, "r") as f:
+                    cb_config = json.load(f)
+            except FileNotFoundError:
+                click.echo(
+                    "Please complete the initialisation before trying to "
+                    + "run a custom project."
+                )
+                sys.exit()
+
+            # Check
+            if "projects" not in cb_config:
+                click.echo("You have not added any projects yet!")
+                sys.exit()
+
+            else:
+                if project not in cb_config["projects"]:
+                    click.echo(
+                        f"Cannot find '{project} in your projects. Add it first."
+                    )
+                else:
+                    # Project found; overwrite paths
+                    project_dir_path = cb_config["projects"][project]
+                    strategy_dir = os.path.join(
+                        project_dir_path, constants.STRATEGY_DIRECTORY
+                    )
+                    strat_config_dir = os.path.join(
+                        project_dir_path, constants.CONFIG_DIRECTORY
+                    )
+
+        # Check for pacakge update; the launched process skips this, as it
+        # was already done by the process that launched it
+        if os.path.exists(init_file):
+            check_update_condition()
+        else:
+            click.echo(
+                "You must configure cryptobots before you can run any strategies!"
+            )
+            click.echo("Use the command 'cryptobots configure' and follow the prompts.")
+            return
+
+        # Keep the output of the invoking command (e.g. the cash and carry
+        # table) on screen when it has already shown the banner
+        if not context.ensure_object(dict).get("banner_shown"):
+            print_banner()
+
+        # Load exchange keys, which are only needed to select the exchange
+        keys_config = read_yaml(paths.keys_path)
 
         # Get exchange to trade on
         exchange, environment = select_exchange_and_env(keys_config, exchange, mode)
@@ -169,17 +182,14 @@ def run(
         # Load strategy configuration
         load_config = True
         if config is not None:
-            if os.path.exists(config):
-                # Config found in cwd
-                strategy_config = utilities.read_yaml(os.path.join(config))
-                load_config = False
-
-            elif os.path.exists(os.path.join(user_config_dir, config)):
-                # Config found in user configurations dir
-                strategy_config = utilities.read_yaml(
-                    os.path.join(user_config_dir, config)
-                )
+            # Look for the config in the cwd, then in the user configurations dir
+            for config_filepath in (config, os.path.join(user_config_dir, config)):
+                try:
+                    strategy_config = cached_read_yaml(config_filepath)
+                except FileNotFoundError:
+                    continue
                 load_config = False
+                break
 
             else:
                 # Did not find
@@ -193,7 +203,7 @@ def run(
         if load_config:
             # Load default configuration
             strategy_name = select_strategy(strat_config_dir, strategy)
-            strategy_config = utilities.read_yaml(
+            strategy_config = cached_read_yaml(
                 os.path.join(strat_config_dir, f"{strategy_name}.yaml")
             )
 
@@ -210,10 +220,7 @@ def run(
         )
 
         # Prompt to change any
-        change_config = click.prompt(
-            text=click.style(text="Edit strategy configuration?", fg="green"),
-            default=False,
-        )
+        change_config = confirm(text="Edit strategy configuration?", default=False)
         if change_config:
             configure_strategy_params(strategy_config, param_map)
 
@@ -223,12 +230,8 @@ def run(
             )
 
             # Optionally save this config to allow re-using
-            save_params = click.prompt(
-                text=click.style(
-                    text="Would you like to save this configuration?", fg="green"
-                ),
-                type=click.BOOL,
-                default=False,
+            save_params = confirm(
+                text="Would you like to save this configuration?", default=False
             )
             if save_params:
                 default_filename = f"{strategy_name}.yaml"
@@ -248,11 +251,8 @@ def run(
                 return
 
         # Prompt for confirmation of settings
-        confirmed = click.confirm(
-            text=click.style(
-                text=f"Deploy strategy on {exchange} in {environment} mode?",
-                fg="green",
-            ),
+        confirmed = confirm(
+            text=f"Deploy strategy on {exchange} in {environment} mode?",
             default=True,
         )
 
@@ -276,19 +276,23 @@ def run(
                     "log_dir": "logs",
                 }
 
-                # Pickle launch file configuration
+                # Launch configuration, referencing the strategy by name so
+                # that it can be re-loaded in the new process
                 configuration = {
                     "configure": configure_kwargs,
-                    "add_strategy": strategy_kwargs,
+                    "add_strategy": {"config_dict": strategy_config},
+                    "strategy_name": strategy_name,
+                    "strategy_dir": strategy_dir,
                 }
-                launchfile = os.path.join(home_dir, ".launch_config")
-                with open(launchfile, "wb") as f:
-                    pickle.dump(configuration, f)
 
-                # Start new process to run bot
-                p = subprocess.Popen(["cryptobots", "run", "--launch", launchfile])
+                # Start new process to run bot, passing the launch configuration
+                # through its stdin
+                pid = spawn_background(
+                    ["cryptobots", "run", "--launch", "-"],
+                    json.dumps(configuration, default=str).encode(),
+                )
 
-                click.echo(f"Bot deployed as background process (PID: {p.pid}).")
+                click.echo(f"Bot deployed as background process (PID: {pid}).")
 
             else:
                 # Run autotrader now
@@ -300,8 +304,13 @@ def run(
 
     if ready_to_run:
         # Run autotrader now
+        from autotrader import AutoTrader
+
         os.chdir(home_dir)
-        click.clear()
+        if not launch:
+            # Launched processes share the terminal of the process that
+            # launched them, which they should not clear
+            click.clear()
         at = AutoTrader()
         at.configure(**configure_kwargs)
         at.add_strategy(**strategy_kwargs)
@@ -336,12 +345,10 @@ def run(
 )
 def backtest(exchange: str, strategy: str, duration: str, plot: bool):
     """Backtest a strategy."""
-    import glob
-    import pandas as pd
-    from datetime import datetime
-    from autotrader import AutoTrader, utilities
     from cryptobots._cli.utilities import (
         print_banner,
+        confirm,
+        cached_read_yaml,
         select_strategy,
         select_exchange,
         get_strategy_object,
@@ -349,46 +356,39 @@ def backtest(exchange: str, strategy: str, duration: str, plot: bool):
         show_strategy_params,
         create_at_inputs,
         save_backtest_config,
+        parse_duration,
     )
 
     # Build paths
-    home_dir = check_home_dir()
-    file_dir = os.path.dirname(os.path.abspath(__file__))
-    strat_config_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.CONFIG_DIRECTORY)
-    )
-    strategy_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.STRATEGY_DIRECTORY)
-    )
+    paths = get_paths()
+    home_dir = paths.home_dir
+    strat_config_dir = paths.strat_config_dir
+    strategy_dir = paths.strategy_dir
     print_banner()
 
     # Get exchange to trade on
     exchange = select_exchange(exchange=exchange)
 
     # Get strategy to run
-    strat_configs = glob.glob(os.path.join(strat_config_dir, "*.yaml"))
-    strategy_name = select_strategy(strat_configs, strategy)
-
-    # Load the strategy object
-    _, strategy_object = get_strategy_object(strategy_name, strategy_dir)
+    strategy_name = select_strategy(strat_config_dir, strategy)
 
     # Load strategy configuration
-    strategy_config = utilities.read_yaml(
+    strategy_config = cached_read_yaml(
         os.path.join(strat_config_dir, f"{strategy_name}.yaml")
     )
 
-    # Make sure strategy is backtest ready
+    # Make sure strategy is backtest ready before importing it
     if not strategy_config.get("BACKTEST_READY", True):
         return click.echo("Sorry - this strategy is not backtest ready.")
 
+    # Load the strategy object
+    _, strategy_object = get_strategy_object(strategy_name, strategy_dir)
+
     # Show strategy parameters
     param_map = show_strategy_params(strategy_config, strategy_name)
 
     # Prompt to change any
-    change_config = click.prompt(
-        text=click.style(text="Edit strategy configuration?", fg="green"),
-        default=False,
-    )
+    change_config = confirm(text="Edit strategy configuration?", default=False)
     if change_config:
         configure_strategy_params(strategy_config, param_map)
 
@@ -411,8 +411,10 @@ def backtest(exchange: str, strategy: str, duration: str, plot: bool):
 
     # Configure backtest period
     # TODO - support ccxt download data
-    end_dt = datetime.now() - pd.Timedelta(strategy_config["INTERVAL"])
-    start_dt = end_dt - pd.Timedelta(duration)
+    end_dt = datetime.now() - parse_duration(strategy_config["INTERVAL"])
+    start_dt = end_dt - parse_duration(duration)
+
+    from autotrader import AutoTrader
 
     # Run autotrader
     os.chdir(home_dir)
@@ -422,11 +424,7 @@ def backtest(exchange: str, strategy: str, duration: str, plot: bool):
     at.backtest(start_dt=start_dt, end_dt=end_dt)
     at.run()
 
-    save_params = click.prompt(
-        text=click.style(text="Save strategy configuration?", fg="green"),
-        type=click.BOOL,
-        default=False,
-    )
+    save_params = confirm(text="Save strategy configuration?", default=False)
     if save_params:
         default_filename = f"{strategy_name}.yaml"
         filename = click.prompt(
@@ -441,25 +439,27 @@ def backtest(exchange: str, strategy: str, duration: str, plot: bool):
 @click.command()
 def stop():
     """Stop running the cryptobots."""
-    import glob
     from cryptobots._cli.utilities import print_banner
 
-    home_dir = check_home_dir()
-    active_dir = os.path.join(home_dir, "active_bots")
+    active_dir = get_paths().active_dir
     print_banner()
 
     # Check active bots
-    activebots_paths = glob.glob(os.path.join(active_dir, "*"))
-    activebots = [p.split(os.sep)[-1] for p in activebots_paths]
+    if os.path.exists(active_dir):
+        with os.scandir(active_dir) as entries:
+            # Skip hidden files, such as .DS_Store, which are not bots
+            activebots = [e.name for e in entries if not e.name.startswith(".")]
+    else:
+        activebots = []
 
     if len(activebots) > 0:
         # Print
         mapper = {}
-        msg = "The following AutoTrader instances are running:\n"
-        for i, name in enumerate(activebots):
-            msg += f"  [{i+1}] {name}\n"
-            mapper[i + 1] = name
-        click.echo(msg)
+        lines = ["The following AutoTrader instances are running:\n"]
+        for i, name in enumerate(activebots, start=1):
+            lines.append(f"  [{i}] {name}\n")
+            mapper[i] = name
+        click.echo("".join(lines))
 
         # Get bot to kill
         bot_selection: int = click.prompt(
@@ -495,16 +495,16 @@ def configure():
     )
 
     # Define paths
-    home_dir = check_home_dir()
-    init_file = os.path.join(home_dir, constants.CONFIG_FILE)
+    paths = get_paths()
+    home_dir = paths.home_dir
+    init_file = paths.init_file
 
     # Print banner
     first_time_config = False if os.path.exists(init_file) else True
     print_banner(first_time_config)
 
     # Check for config directory
-    config_dir = os.path.join(home_dir, constants.CONFIG_DIRECTORY)
-    check_dir_exists(config_dir, create=True)
+    check_dir_exists(paths.config_dir, create=True)
 
     # Display help to first time users
     if first_time_config:
@@ -545,7 +545,7 @@ def configure():
             pass
 
     if first_time_config:
-        # Add init file and write current time
+        # Add init file
         update_config(init_file)
         click.echo("Cryptobots initialised.")
 
@@ -553,29 +553,28 @@ def configure():
 @click.command()
 def strategies():
     """Display the implemented strategies."""
-    import sys
-    import importlib.util
     from cryptobots._cli.utilities import (
-        strategy_name_from_module_name,
         print_banner,
         list_strategies,
+        get_package_paths,
+        get_strategy_registry,
+        get_strategy_object,
     )
 
-    # Configure paths
-    file_dir = os.path.dirname(os.path.abspath(__file__))
-    strat_config_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.CONFIG_DIRECTORY)
-    )
-    strategy_dir = os.path.normpath(
-        os.path.join(file_dir, "..", constants.STRATEGY_DIRECTORY)
-    )
+    # Configure paths; listing the packaged strategies does not need the home
+    # directory, so avoid prompting for it
+    paths = get_package_paths()
+    strat_config_dir = paths.strat_config_dir
+    strategy_dir = paths.strategy_dir
 
     # List available strategies
     msg = "Cryptobots has the following strategies:\n"
     mapper, msg = list_strategies(strat_config_dir, msg)
+    registry = get_strategy_registry(strat_config_dir)
 
     # Prompt for more info on a strategy
     while True:
+        # Redraw the banner, which also clears the previous strategy info
         print_banner()
         click.echo(msg)
         strategy_selection: int = click.prompt(
@@ -584,18 +583,17 @@ def strategies():
         )
         strategy_name = mapper[strategy_selection]
 
-        # Load the strategy object
-        spec = importlib.util.spec_from_file_location(
-            strategy_name, os.path.join(strategy_dir, f"{strategy_name}.py")
-        )
-        strat_module = importlib.util.module_from_spec(spec)
-        sys.modules[strategy_name] = strat_module
-        spec.loader.exec_module(strat_module)
-        strategy_obj_name = strategy_name_from_module_name(strategy_name)
-        strategy_object = getattr(strat_module, strategy_obj_name)
-        click.echo(strategy_object.__doc__)
+        if registry is not None:
+            # Get the docstring from the registry
+            strategy_doc = registry[strategy_name]["doc"]
+
+        else:
+            # Load the strategy object
+            _, strategy_object = get_strategy_object(strategy_name, strategy_dir)
+            strategy_doc = strategy_object.__doc__
+
+        click.echo(strategy_doc)
         click.pause()
-        click.clear()
 
 
 @click.command()
@@ -623,11 +621,11 @@ def strategies():
 def cash_and_carry(context: click.Context, exchange: str, prices: bool, number: int):
     """Display cash and carry opportunities."""
     import asyncio
-    from tabulate import tabulate
     from cryptobots._cli.utilities import (
         get_cash_and_carry,
         select_exchange,
         print_banner,
+        confirm,
     )
 
     print_banner()
@@ -635,10 +633,21 @@ def cash_and_carry(context: click.Context, exchange: str, prices: bool, number:
     # Get exchange to trade on
     exchange = select_exchange(exchange=exchange)
 
+    try:
+        # Use the uvloop event loop if it is installed
+        import uvloop
+
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+
     # Load funding rates
-    cac = asyncio.run(get_cash_and_carry(exchange, prices))
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        cac = runner.run(get_cash_and_carry(exchange, prices))
 
     # Display table
+    from tabulate import tabulate
+
     click.echo(
         click.style(
             f"Top {number} cash and carry opportunities on {exchange}", underline=True
@@ -647,13 +656,10 @@ def cash_and_carry(context: click.Context, exchange: str, prices: bool, number:
     print(tabulate(cac.head(number), headers="keys", tablefmt="fancy_outline"))
 
     # Prompt to deploy from here
-    deploy = click.prompt(
-        click.style("Deploy cash and carry strategy?"),
-        default=True,
-        show_default=True,
-    )
+    deploy = confirm(text="Deploy cash and carry strategy?", default=True)
     if deploy:
         # Run strategy with best instrument
+        context.ensure_object(dict)["banner_shown"] = True
         context.invoke(
             run,
             strategy="cc",
@@ -663,13 +669,30 @@ def cash_and_carry(context: click.Context, exchange: str, prices: bool, number:
         )
 
 
-# Add commands to CLI group
-cli.add_command(configure)
-cli.add_command(run)
-cli.add_command(stop)
-cli.add_command(strategies)
-cli.add_command(backtest)
-cli.add_command(cash_and_carry)
+@click.group(commands=[configure, run, stop, strategies, backtest, cash_and_carry, tui])
+@click.option(
+    "--no-banner",
+    help="Do not display the banner. This is the default when not in a terminal.",
+    envvar="CRYPTOBOTS_NO_BANNER",
+    default=False,
+    show_default=True,
+    is_flag=True,
+)
+@click.option(
+    "--yes",
+    "-y",
+    help="Answer confirmation prompts with their default. The interactive "
+    + "configure menus are not affected.",
+    default=False,
+    show_default=True,
+    is_flag=True,
+)
+@click.pass_context
+def cli(context: click.Context, no_banner: bool, yes: bool):
+    """The cryptobots command line interface."""
+    context.ensure_object(dict)
+    context.obj["no_banner"] = no_banner or not sys.stdout.isatty()
+    context.obj["yes"] = yes
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@ KEYS_FILENAME = "keys.yaml"
 STRATEGY_DIRECTORY = "strategies"
 CONFIG_DIRECTORY = "config"
 USER_CONFIG_DIRECTORY = "user_configurations"
+CACHE_DIRECTORY = "cache"
+UPDATE_CHECK_FILENAME = "last_update_check"
+ACTIVE_DIRECTORY = "active_bots"
 CONFIG_FILE = "configuration.json"
-STRFTIME = "%Y-%m-%d"
+REGISTRY_FILENAME = "_registry.json"
 DEFAULT_HOME_DIRECTORY = ".cryptobots"
@@ -1,21 +1,58 @@
 import os
+import re
 import sys
 import time
-import ccxt
 import json
-import glob
+import yaml
 import click
-import asyncio
-import importlib
-import pandas as pd
-from art import tprint
-import ccxt.pro as ccxt_pro
-from typing import Optional
+import pickle
+import hashlib
+import threading
+import functools
+import importlib.util
+from typing import Optional, NamedTuple, TYPE_CHECKING
 from cryptobots._cli import constants
 from datetime import datetime, timedelta
-from autotrader.utilities import read_yaml, write_yaml
 
+try:
+    # Use the LibYAML bindings when available
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
+if TYPE_CHECKING:
+    import ccxt.pro as ccxt_pro
+
+# Strategy configuration keys which are not shown as editable parameters
+EXCLUDED_PARAMS = frozenset(
+    {
+        "name",
+        "module",
+        "class",
+        "interval",
+        "period",
+        "include",
+        "backtest_ready",
+    }
+)
+
+# Matches the base token of a perp symbol, excluding any leading multiplier
+PERP_BASE_PATTERN = r"^(?:10+)?([^/]+)/"
+
+# Matches one component of a duration string, such as '1h' or '30 min'
+DURATION_PATTERN = r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]+)\s*"
+
+# Maps (lower case) duration unit aliases to timedelta arguments
+DURATION_UNITS = {
+    **dict.fromkeys(["s", "sec", "secs", "second", "seconds"], "seconds"),
+    **dict.fromkeys(["m", "min", "mins", "minute", "minutes"], "minutes"),
+    **dict.fromkeys(["h", "hr", "hrs", "hour", "hours"], "hours"),
+    **dict.fromkeys(["d", "day", "days"], "days"),
+    **dict.fromkeys(["w", "week", "weeks"], "weeks"),
+}
+
+
+@functools.lru_cache(maxsize=None)
 def strategy_name_from_module_name(name: str):
     return "".join([s.capitalize() for s in name.split("_")])
 
@@ -23,43 +60,209 @@ def strategy_name_from_module_name(name: str):
 def check_dir_exists(dir_path: str, create: bool = True):
     """Checks if a directory exists, and optionally creates it
     if it does not."""
-    exists = False
-    if not os.path.exists(dir_path):
-        # Directory does not exist
-        if create:
-            # Create directory
-            os.mkdir(dir_path)
-            exists = True
-    else:
-        # Directory does exist
-        exists = True
+    if create:
+        # Create directory, if it does not already exist
+        os.makedirs(dir_path, exist_ok=True)
+        return True
+
+    return os.path.exists(dir_path)
+
+
+def list_strategy_config_files(dir_path: str) -> list[str]:
+    """Returns the paths to the strategy configuration files in a directory,
+    skipping any keys files and hidden files (such as AppleDouble files)."""
+    with os.scandir(dir_path) as entries:
+        return [
+            e.path
+            for e in entries
+            if e.name.endswith(".yaml")
+            and not e.name.startswith(".")
+            and "keys" not in e.name
+            and e.is_file()
+        ]
+
+
+def read_yaml(filepath: str) -> dict:
+    """Reads a YAML file."""
+    # Read as bytes, so that the loader can detect the encoding itself rather
+    # than have Python decode the file first
+    with open(filepath, "rb") as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def write_yaml(data: dict, filepath: str):
+    """Writes data to a YAML file."""
+    with open(filepath, "w") as f:
+        yaml.dump(data, f, Dumper=SafeDumper)
+
+
+@functools.lru_cache(maxsize=1)
+def get_cache_dir() -> Optional[str]:
+    """Returns the cache directory, creating it if required. Returns None if
+    the cryptobots home directory has not been created yet. The result is
+    memoised, so the directory is only checked once per process."""
+    cache_dir = os.path.join(
+        os.path.expanduser("~"),
+        constants.DEFAULT_HOME_DIRECTORY,
+        constants.CACHE_DIRECTORY,
+    )
+    if not os.path.exists(os.path.dirname(cache_dir)):
+        return None
+    check_dir_exists(cache_dir, create=True)
+    return cache_dir
+
+
+def cached_read_yaml(filepath: str):
+    """Reads a YAML file, using a cached copy of the parsed contents when the
+    file has not been modified since it was last read. This should not be used
+    for files containing secrets, such as the exchange keys, as the cache is
+    written to disk."""
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        # Home directory has not been created yet, read directly
+        return read_yaml(filepath)
+
+    # Cache files are keyed by the source path, its modification time and its
+    # size, so that an edit within the mtime resolution is still detected
+    prefix = f"{hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()}."
+    stat = os.stat(filepath)
+    cache_filepath = os.path.join(
+        cache_dir, f"{prefix}{stat.st_mtime_ns}.{stat.st_size}.pkl"
+    )
+    try:
+        # Cache hit
+        with open(cache_filepath, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Cache miss, or an unreadable cache entry (a truncated or foreign
+        # pickle can raise almost anything) which is removed and replaced below
+        pass
+
+    # Cache miss; parse the file
+    contents = read_yaml(filepath)
+
+    import pickletools
+
+    tmp_filepath = f"{cache_filepath}.{os.getpid()}.tmp"
+    try:
+        # Remove stale entries for this file
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.name.endswith(".pkl"):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        # Already removed by another process
+                        pass
+
+        # Cache the result, writing to a temporary file first so that a
+        # concurrent reader never sees a partially written cache
+        with open(tmp_filepath, "wb") as f:
+            f.write(
+                pickletools.optimize(
+                    pickle.dumps(contents, protocol=pickle.HIGHEST_PROTOCOL)
+                )
+            )
+        os.replace(tmp_filepath, cache_filepath)
+
+    except OSError:
+        # The cache is only an optimisation, so failing to write it (for
+        # example, on a full disk) must not fail the read
+        try:
+            os.remove(tmp_filepath)
+        except OSError:
+            pass
+
+    return contents
+
+
+@functools.lru_cache(maxsize=1)
+def render_banner() -> str:
+    """Renders the banner text art."""
+    from art import text2art
 
-    return exists
+    return text2art("CryptoBots", font="tarty1")
 
 
 def print_banner(animation: bool = False):
+    # Check if the banner has been disabled
+    context = click.get_current_context(silent=True)
+    if context is not None and (context.obj or {}).get("no_banner"):
+        return
+
     click.clear()
-    tprint("CryptoBots", font="tarty1")
-    trail = []
+    click.echo(render_banner())
     if animation:
-        for i in range(81):
-            time.sleep(0.05)
-            char = "₿" if i % 10 == 0 else "-"
-            trail.append(char)
-            print("".join(trail) + "🙮", end="\r")
-        print()
         subtitle = "AN AUTOTRADER PROJECT"
         bold = "\033[1m"
         reset = "\033[0m"
         spacer = "                             "
-        for i in range(len(subtitle)):
-            time.sleep(0.1)
-            print(spacer, bold, subtitle[: i + 1], reset, end="\r")
-        time.sleep(0.5)
-        print()
+        trail = "".join("₿" if i % 10 == 0 else "-" for i in range(81))
+        if sys.stdout.isatty() and not os.environ.get("CRYPTOBOTS_NO_ANIMATION"):
+            for i in range(1, len(trail) + 1):
+                time.sleep(0.05)
+                sys.stdout.write(trail[:i] + "🙮\r")
+                sys.stdout.flush()
+            print()
+            for i in range(len(subtitle)):
+                time.sleep(0.1)
+                sys.stdout.write(f"{spacer} {bold} {subtitle[: i + 1]} {reset}\r")
+                sys.stdout.flush()
+            time.sleep(0.5)
+            print()
+
+        else:
+            # Print the final frame only
+            print(trail + "🙮")
+            print(spacer, bold, subtitle, reset)
     print()
 
 
+def confirm(text: str, default: bool = False) -> bool:
+    """Prompts the user for a yes/no answer. Returns the default without
+    prompting when the --yes option has been set."""
+    context = click.get_current_context(silent=True)
+    if context is not None and (context.obj or {}).get("yes"):
+        return default
+
+    return click.confirm(text=click.style(text=text, fg="green"), default=default)
+
+
+def spawn_background(args: list[str], stdin: bytes) -> int:
+    """Starts a process in a new session, writes to its stdin and returns its
+    PID. Uses posix_spawn where available, rather than forking the (large)
+    current process."""
+    if not hasattr(os, "posix_spawnp"):
+        import subprocess
+
+        p = subprocess.Popen(args, stdin=subprocess.PIPE, start_new_session=True)
+        p.stdin.write(stdin)
+        p.stdin.close()
+        return p.pid
+
+    # Both ends of the pipe are non-inheritable; only the read end is passed
+    # to the child, as its stdin
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(
+            args[0],
+            args,
+            os.environ,
+            file_actions=[(os.POSIX_SPAWN_DUP2, read_fd, 0)],
+            setsid=True,
+        )
+    except OSError:
+        os.close(write_fd)
+        raise
+    finally:
+        os.close(read_fd)
+
+    with os.fdopen(write_fd, "wb") as f:
+        f.write(stdin)
+
+    return pid
+
+
 def update_keys_config(keys_config: dict, exchange: str):
     exchange_config_key = f"CCXT:{exchange.upper()}"
 
@@ -79,7 +282,7 @@ def update_keys_config(keys_config: dict, exchange: str):
         # This exchange has been configured before
         if net_key in keys_config[exchange_config_key]:
             # This net has been configured already
-            overwrite = click.prompt(
+            overwrite = click.confirm(
                 text=click.style(
                     text=f"You have already configured keys for {exchange} {net_key}. Would you like to continue and overwrite?",
                     fg="green",
@@ -92,7 +295,7 @@ def update_keys_config(keys_config: dict, exchange: str):
 
             else:
                 # Delete this key?
-                delete = click.prompt(
+                delete = click.confirm(
                     text=click.style(
                         text=f"Would you like to delete this key?",
                         fg="green",
@@ -112,113 +315,220 @@ def update_keys_config(keys_config: dict, exchange: str):
     api_key = click.prompt(text="    Please enter your API key")
     secret = click.prompt(text="    Please enter your API secret", hide_input=True)
 
-    # Add exchange to config
+    # Add exchange to config, creating a new key for this exchange if needed
     # TODO - ccxt options customisation
-    if exchange_config_key in keys_config:
-        # Append to existing
-        keys_config[exchange_config_key][net_key] = {
-            "api_key": api_key,
-            "secret": secret,
-        }
-    else:
-        # Create new key for this exchange
-        keys_config[exchange_config_key] = {
-            net_key: {
-                "api_key": api_key,
-                "secret": secret,
-            },
-        }
+    keys_config.setdefault(exchange_config_key, {})[net_key] = {
+        "api_key": api_key,
+        "secret": secret,
+    }
 
     return keys_config
 
 
-def check_for_update():
-    """Checks if there is a newer version of cryptobots available."""
-    import pip
-    import johnnydep.logs
-
-    # Quieten logging
-    johnnydep.logs.configure_logging(verbosity=-1)
-
-    # Get dist
-    dist = johnnydep.JohnnyDist("cryptobots")
-    i, l = dist.version_installed, dist.version_latest
-    if i != l:
-        click.echo("A new version of cryptobots is available!")
-        update = click.prompt(
-            text=click.style(text="Would you like to update cryptobots?", fg="green"),
-            default=True,
+def check_for_update(marker_filepath: Optional[str] = None):
+    """Checks if there is a newer version of cryptobots available. If a marker
+    file is provided, its modification time is updated once the check has
+    completed, to record when it was last performed."""
+    import http.client
+    import urllib.request
+    from importlib.metadata import version, PackageNotFoundError
+    from packaging.version import Version
+
+    # Query the latest release from PyPI, failing silently when offline or
+    # when cryptobots is not installed as a distribution (e.g. from source)
+    try:
+        installed = Version(version("cryptobots"))
+        with urllib.request.urlopen(
+            "https://pypi.org/pypi/cryptobots/json", timeout=2
+        ) as response:
+            latest = Version(json.load(response)["info"]["version"])
+    except (
+        PackageNotFoundError,
+        OSError,
+        ValueError,
+        KeyError,
+        TypeError,
+        http.client.HTTPException,
+    ):
+        return
+
+    # Only notify when PyPI has a newer release, not when the installed version
+    # is ahead of it (e.g. a development build)
+    if latest > installed:
+        click.echo(
+            click.style(
+                f"A new version of cryptobots is available ({installed} -> "
+                + f"{latest}). Run `pip install --upgrade cryptobots` to update.",
+                fg="green",
+            )
         )
-        if update:
-            pip.main(["install", "--upgrade", "cryptobots"])
-
-
-def check_update_condition(config_filepath: str):
-    # Check when last update check was performed
-    if os.path.exists(config_filepath):
-        # Load existing config
-        with open(config_filepath, "r") as f:
-            config = json.load(f)
-
-        # Get update time
-        last_update = datetime.strptime(config["last_update"], constants.STRFTIME)
-
-    else:
-        # Config doesn't exist yet
-        last_update = datetime.now() - timedelta(days=2)
 
-    # Check for update
+    # Record the check, now that it has completed
+    if marker_filepath is not None:
+        try:
+            with open(marker_filepath, "a"):
+                pass
+            os.utime(marker_filepath)
+        except OSError:
+            # The check will be repeated next run
+            pass
+
+
+def check_update_condition():
+    # Check when last update check was performed, using the modification time
+    # of an empty marker file in the cache directory, which is touched when the
+    # check completes. Without a cache directory the check cannot be recorded,
+    # so it is performed every run
+    cache_dir = get_cache_dir()
+    marker_filepath = None
+    last_update = datetime.now() - timedelta(days=2)
+    if cache_dir is not None:
+        marker_filepath = os.path.join(cache_dir, constants.UPDATE_CHECK_FILENAME)
+        if os.path.exists(marker_filepath):
+            last_update = datetime.fromtimestamp(os.path.getmtime(marker_filepath))
+
+    # Check for update in the background, so that it doesn't block the run. The
+    # check is only recorded if it completes, so that it is retried on the
+    # next run if the process exits first
     if last_update.date() < datetime.now().date():
-        check_for_update()
-
-        # Update file
-        update_config(config_filepath)
+        threading.Thread(
+            target=check_for_update, args=(marker_filepath,), daemon=True
+        ).start()
 
 
+@functools.lru_cache(maxsize=1)
 def check_home_dir():
     """Check if the default cryptobots home directory exists, and if not, ask user
     for path.
     """
     # Find home directory and configure paths
-    home_dir = os.path.join(os.path.expanduser("~"), constants.DEFAULT_HOME_DIRECTORY)
+    default_home_dir = os.path.join(
+        os.path.expanduser("~"), constants.DEFAULT_HOME_DIRECTORY
+    )
+    home_dir = default_home_dir
     if not os.path.exists(home_dir):
         home_dir: str = click.prompt(
             text=click.style(text="Enter cryptobots home directory", fg="green"),
-            default=os.path.join(
-                os.path.expanduser("~"), constants.DEFAULT_HOME_DIRECTORY
-            ),
+            default=default_home_dir,
         )
 
         # Make the directory
-        os.mkdir(home_dir)
+        os.makedirs(home_dir, exist_ok=True)
 
     return home_dir
 
 
-def check_valid_env(keys_config: dict, exchange: str, env: str):
+class PackagePaths(NamedTuple):
+    strat_config_dir: str
+    strategy_dir: str
+
+
+class Paths(NamedTuple):
+    home_dir: str
+    config_dir: str
+    strat_config_dir: str
+    strategy_dir: str
+    user_config_dir: str
+    init_file: str
+    active_dir: str
+    keys_path: str
+
+
+@functools.lru_cache(maxsize=1)
+def get_package_dir() -> str:
+    """Returns the directory of the cryptobots package."""
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@functools.lru_cache(maxsize=1)
+def get_package_paths() -> PackagePaths:
+    """Returns the paths to the strategies packaged with cryptobots. Unlike
+    get_paths, this does not require the home directory."""
+    package_dir = get_package_dir()
+    return PackagePaths(
+        strat_config_dir=os.path.join(package_dir, constants.CONFIG_DIRECTORY),
+        strategy_dir=os.path.join(package_dir, constants.STRATEGY_DIRECTORY),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_paths() -> Paths:
+    """Returns the paths used by the CLI commands."""
+    home_dir = check_home_dir()
+    package_paths = get_package_paths()
+    config_dir = os.path.join(home_dir, constants.CONFIG_DIRECTORY)
+    return Paths(
+        home_dir=home_dir,
+        config_dir=config_dir,
+        strat_config_dir=package_paths.strat_config_dir,
+        strategy_dir=package_paths.strategy_dir,
+        user_config_dir=os.path.normpath(
+            os.path.join(home_dir, constants.USER_CONFIG_DIRECTORY)
+        ),
+        init_file=os.path.join(home_dir, constants.CONFIG_FILE),
+        active_dir=os.path.join(home_dir, constants.ACTIVE_DIRECTORY),
+        keys_path=os.path.join(config_dir, constants.KEYS_FILENAME),
+    )
+
+
+def check_valid_env(exchange_config: dict, env: str):
     if env is None:
         return False, ""
     environment = "live" if env.lower() == "live" else "paper"
     net = "mainnet" if environment == "live" else "testnet"
-    if net in keys_config[f"CCXT:{exchange.upper()}"]:
-        valid_env = True
-    else:
-        valid_env = False
-        click.echo(
-            f"{environment} mode has not been configured for {exchange}. Please "
-            + "switch mode and try again, or exit and use the configure method."
-        )
+    valid_env = net in exchange_config
     return valid_env, environment
 
 
+@functools.lru_cache(maxsize=1)
+def get_exchanges() -> frozenset[str]:
+    """Returns the names of the exchanges supported by ccxt. The names are
+    cached for the installed version of ccxt, so that ccxt does not need to be
+    imported just to validate an exchange name."""
+    from importlib.metadata import version
+
+    cache_dir = get_cache_dir()
+    cache_filepath = None
+    if cache_dir is not None:
+        cache_filepath = os.path.join(
+            cache_dir, f"ccxt-{version('ccxt')}-exchanges.json"
+        )
+        try:
+            with open(cache_filepath, "r") as f:
+                return frozenset(json.load(f))
+        except (FileNotFoundError, ValueError):
+            # Cache miss, or a corrupt cache which is replaced below
+            pass
+
+    # Get exchanges from ccxt
+    import ccxt
+
+    exchanges = frozenset(ccxt.exchanges)
+    if cache_filepath is not None:
+        # Write to a temporary file first, so that an interrupted write cannot
+        # leave a truncated cache behind
+        tmp_filepath = f"{cache_filepath}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filepath, "w") as f:
+                json.dump(sorted(exchanges), f)
+            os.replace(tmp_filepath, cache_filepath)
+        except OSError:
+            # The cache is only an optimisation
+            pass
+
+    return exchanges
+
+
 def select_exchange(
     exchange: Optional[str] = None,
     default_exchange: Optional[str] = None,
 ):
+    exchanges = get_exchanges()
+
     # Check inputted exchange
     valid_exchange = False
     if exchange is not None:
-        if exchange.lower() in ccxt.exchanges:
+        if exchange.lower() in exchanges:
             valid_exchange = True
 
     while not valid_exchange:
@@ -231,7 +541,7 @@ def select_exchange(
             default=default_exchange,
             prompt_suffix=" ",
         )
-        if exchange.lower() in ccxt.exchanges:
+        if exchange.lower() in exchanges:
             valid_exchange = True
         else:
             click.echo("Invalid exchange. Please check spelling and try again.")
@@ -247,7 +557,7 @@ def select_exchange_and_env(
     # Get default exchange name
     if len(keys_config) == 1:
         # Only one exchange configured, use this as default
-        default_exchange = list(keys_config)[0].split(":")[-1]
+        default_exchange = next(iter(keys_config)).split(":")[-1]
     else:
         default_exchange = None
 
@@ -257,19 +567,32 @@ def select_exchange_and_env(
         default_exchange=default_exchange,
     )
 
+    # Get the keys configured for this exchange
+    _exchange_config = keys_config.get(f"CCXT:{exchange.upper()}")
+    if _exchange_config is None:
+        raise click.ClickException(
+            f"No API keys have been configured for {exchange}. Use the "
+            + "command 'cryptobots configure' to add them."
+        )
+
     # Get trading environment (try from args first)
-    valid_env, environment = check_valid_env(keys_config, exchange, mode)
+    valid_env, environment = check_valid_env(_exchange_config, mode)
 
     # Set default environment based on config
-    _exchange_config = keys_config[f"CCXT:{exchange.upper()}"]
     if len(_exchange_config) == 1:
         # Only one environment configured, use this as default
-        default_env = list(_exchange_config)[0]
+        default_env = "live" if next(iter(_exchange_config)) == "mainnet" else "test"
     else:
         default_env = None
 
     # Complete getting trading environment
     while not valid_env:
+        if environment:
+            # An environment was requested, but it has not been configured
+            click.echo(
+                f"{environment} mode has not been configured for {exchange}. Please "
+                + "switch mode and try again, or exit and use the configure method."
+            )
         environment_response: str = click.prompt(
             text=click.style(
                 text="Trade in live mode or test mode?",
@@ -278,32 +601,57 @@ def select_exchange_and_env(
             type=click.STRING,
             default=default_env,
         )
-        valid_env, environment = check_valid_env(
-            keys_config, exchange, environment_response
-        )
+        valid_env, environment = check_valid_env(_exchange_config, environment_response)
 
     return exchange, environment
 
 
+@functools.lru_cache(maxsize=1)
+def load_strategy_registry() -> Optional[dict]:
+    """Loads the registry of strategies packaged with cryptobots. Returns None
+    if the registry has not been built, such as when running from source."""
+    registry_filepath = os.path.join(get_package_dir(), constants.REGISTRY_FILENAME)
+    if not os.path.exists(registry_filepath):
+        return None
+
+    with open(registry_filepath, "r") as f:
+        return json.load(f)
+
+
+def get_strategy_registry(strat_config_dir: str) -> Optional[dict]:
+    """Returns the strategy registry if the strategy configuration directory
+    is the one packaged with cryptobots, otherwise None."""
+    package_config_dir = get_package_paths().strat_config_dir
+    if os.path.normpath(strat_config_dir) != package_config_dir:
+        # User project
+        return None
+
+    return load_strategy_registry()
+
+
 def list_strategies(strat_config_dir: str, msg: Optional[str] = None):
-    # Load config files
-    strat_configs = [
-        read_yaml(f)
-        for f in glob.glob(os.path.join(strat_config_dir, "*.yaml"))
-        if "keys" not in f
-    ]
-    strategy_names = {c["NAME"]: c for c in strat_configs}
-    mod_name_map = {c["MODULE"]: c["NAME"] for c in strat_configs}
+    registry = get_strategy_registry(strat_config_dir)
+    if registry is not None:
+        # Use pre-built registry
+        mod_name_map = {mod: info["name"] for mod, info in registry.items()}
+
+    else:
+        # Load config files
+        strat_configs = [
+            cached_read_yaml(f) for f in list_strategy_config_files(strat_config_dir)
+        ]
+        mod_name_map = {c["MODULE"]: c["NAME"] for c in strat_configs}
 
     # Construct selection mapper
     mapper = {}
     if msg is None:
         msg = "Select a strategy to run:\n"
-    for i, (mod, name) in enumerate(mod_name_map.items()):
-        msg += f"  [{i+1}] {mod}: {name}\n"
-        mapper[i + 1] = mod
+    lines = [msg]
+    for i, (mod, name) in enumerate(mod_name_map.items(), start=1):
+        lines.append(f"  [{i}] {mod}: {name}\n")
+        mapper[i] = mod
 
-    return mapper, msg
+    return mapper, "".join(lines)
 
 
 def select_strategy(strat_config_dir: str, strategy: Optional[str] = None):
@@ -336,6 +684,7 @@ def select_strategy(strat_config_dir: str, strategy: Optional[str] = None):
     return strategy_name
 
 
+@functools.lru_cache(maxsize=32)
 def get_strategy_object(strategy_name: str, strategy_dir: str):
     spec = importlib.util.spec_from_file_location(
         strategy_name, os.path.join(strategy_dir, f"{strategy_name}.py")
@@ -357,34 +706,30 @@ def show_strategy_params(
 
     # Build parameter map
     param_map = {}
-    EXCLUDE = [
-        "name",
-        "module",
-        "class",
-        "interval",
-        "period",
-        "include",
-        "backtest_ready",
-    ]
-    INCLUDE = strategy_config.get("INCLUDE", [])
+    INCLUDE = set(strategy_config.get("INCLUDE", []))
     if msg is None:
         msg = f"Parameters for {strategy_name} strategy:\n"
+    lines = [msg]
     for key, val in strategy_config.items():
         # Check for nested param
         if isinstance(val, dict):
             for key_j, val_j in val.items():
-                msg += f"  [{len(param_map)+1}] {key_j}: {val_j}\n"
-                param_map[len(param_map) + 1] = f"nested:{key}.{key_j}"
+                i = len(param_map) + 1
+                lines.append(f"  [{i}] {key_j}: {val_j}\n")
+                param_map[i] = f"nested:{key}.{key_j}"
         else:
-            if key.lower() == "watchlist":
-                msg += f"  [{len(param_map)+1}] symbol: {val[0]}\n"
-                param_map[len(param_map) + 1] = f"nested:WATCHLIST.symbol"
+            lower_key = key.lower()
+            if lower_key == "watchlist":
+                i = len(param_map) + 1
+                lines.append(f"  [{i}] symbol: {val[0]}\n")
+                param_map[i] = f"nested:WATCHLIST.symbol"
 
-            elif key.lower() not in EXCLUDE or key in INCLUDE:
-                msg += f"  [{len(param_map)+1}] {key}: {val}\n"
-                param_map[len(param_map) + 1] = key
+            elif lower_key not in EXCLUDED_PARAMS or key in INCLUDE:
+                i = len(param_map) + 1
+                lines.append(f"  [{i}] {key}: {val}\n")
+                param_map[i] = key
 
-    click.echo(msg)
+    click.echo("".join(lines))
 
     return param_map
 
@@ -419,7 +764,7 @@ def configure_strategy_params(
 
         # Print
         click.echo(f"Updated {param_name} to {param_value}.")
-        change_config = click.prompt(
+        change_config = click.confirm(
             text=click.style(text="Edit another?", fg="green"),
             default=True,
         )
@@ -456,8 +801,7 @@ def create_at_inputs(
 def save_backtest_config(home_dir: str, filename: str, config: dict):
     # Check for strategy config directory
     strat_conf_dir = os.path.join(home_dir, "user_configurations")
-    if not os.path.exists(strat_conf_dir):
-        os.mkdir(strat_conf_dir)
+    os.makedirs(strat_conf_dir, exist_ok=True)
 
     # Save
     fp = os.path.join(strat_conf_dir, filename)
@@ -467,6 +811,35 @@ def save_backtest_config(home_dir: str, filename: str, config: dict):
     return fp
 
 
+def parse_duration(duration: str) -> timedelta:
+    """Parses a duration string such as '30s', '15min', '1h30m' or '3 days'
+    into a timedelta. Strings which are not in this form are passed to
+    pd.Timedelta."""
+    components = re.findall(DURATION_PATTERN, duration)
+    if re.fullmatch(f"(?:{DURATION_PATTERN})+", duration) and all(
+        # 'M' is left to pandas, which rejects it as ambiguous with months
+        unit.lower() in DURATION_UNITS and unit != "M"
+        for _, unit in components
+    ):
+        # Sum the components, allowing the same unit to appear more than once
+        kwargs = {}
+        for value, unit in components:
+            name = DURATION_UNITS[unit.lower()]
+            kwargs[name] = kwargs.get(name, 0) + float(value)
+        return timedelta(**kwargs)
+
+    # Fall back to pandas for any other format it supports
+    import pandas as pd
+
+    try:
+        return pd.Timedelta(duration).to_pytimedelta()
+    except ValueError:
+        raise click.ClickException(
+            f"Invalid duration '{duration}'. Durations must be a number "
+            + "followed by a unit, such as '30s', '15min', '1h' or '3d'."
+        )
+
+
 def create_link(url: str, label: str = None) -> str:
     if label is None:
         # Display URL as label
@@ -476,7 +849,9 @@ def create_link(url: str, label: str = None) -> str:
     return escape_mask.format(parameters, url, label)
 
 
-async def funding_rates(exchange: ccxt_pro.Exchange):
+async def funding_rates(exchange: "ccxt_pro.Exchange"):
+    import pandas as pd
+
     # Load funding rates
     funding: dict[str, dict] = await exchange.fetch_funding_rates()
     formatted_funding = {
@@ -490,17 +865,35 @@ async def funding_rates(exchange: ccxt_pro.Exchange):
     return df
 
 
-async def get_prices(exchange: ccxt_pro.Exchange, symbols: list[str]):
-    """Returns mid prices for a list of symbols."""
-    tasks = [exchange.fetch_order_book(symbol, limit=1) for symbol in symbols]
-    obs = await asyncio.gather(*tasks, return_exceptions=False)
-    prices = {ob["symbol"]: (ob["bids"][0][0] + ob["asks"][0][0]) / 2 for ob in obs}
+async def get_prices(
+    exchange: "ccxt_pro.Exchange", symbols: list[str], max_concurrency: int = 20
+):
+    """Returns mid prices for a list of symbols. Symbols whose order book
+    could not be fetched are omitted."""
+    import asyncio
+
+    # Limit the number of requests in flight at once
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_order_book(symbol: str):
+        async with semaphore:
+            return await exchange.fetch_order_book(symbol, limit=1)
+
+    tasks = [fetch_order_book(symbol) for symbol in symbols]
+    obs = await asyncio.gather(*tasks, return_exceptions=True)
+    prices = {
+        ob["symbol"]: (ob["bids"][0][0] + ob["asks"][0][0]) / 2
+        for ob in obs
+        if not isinstance(ob, BaseException) and ob["bids"] and ob["asks"]
+    }
     return prices
 
 
 async def get_cash_and_carry(exchange: str, prices: bool):
+    import ccxt.pro as ccxt_pro
+
     # Instantiate exchange
-    exchange: ccxt.Exchange = getattr(ccxt_pro, exchange.lower())()
+    exchange: ccxt_pro.Exchange = getattr(ccxt_pro, exchange.lower())()
     markets = await exchange.load_markets()
 
     # Get funding rates
@@ -509,28 +902,14 @@ async def get_cash_and_carry(exchange: str, prices: bool):
     # Convert to percentages
     df = df * 100
 
-    # Add column for spot
-    has_spot = {}
-    perp_to_spot = {}
-    for symbol in df.index:
-        # Remove leading multiplier
-        if symbol.startswith("10"):
-            # Find where multiplier stops
-            for i, char in enumerate(symbol[2:]):
-                if char != "0":
-                    break
-            base = symbol[i + 2 :].split("/")[0]
-
-        else:
-            base = symbol.split("/")[0]
-
-        # Check for base token in spot markets
-        spot_symbol = f"{base}/USDT"
-        spot_exists = spot_symbol in markets
-        has_spot[symbol] = spot_exists
-        if spot_exists:
-            perp_to_spot[symbol] = spot_symbol
-    df["spot available"] = pd.Series(has_spot)
+    # Add column for spot, removing any leading multiplier (e.g. 1000PEPE)
+    # from the perp symbols to get the base token
+    bases = df.index.str.extract(PERP_BASE_PATTERN, expand=False)
+    spot_symbols = bases + "/USDT"
+    has_spot = spot_symbols.isin(list(markets))
+    perp_to_spot = dict(zip(df.index[has_spot], spot_symbols[has_spot]))
+    df["spot available"] = has_spot
+    df["token"] = bases
 
     # For cash and carry, filter by markets which have spot
     cash_and_carry = (
@@ -539,11 +918,6 @@ async def get_cash_and_carry(exchange: str, prices: bool):
         .dropna()
     )
 
-    # Add spot symbols
-    cash_and_carry["token"] = pd.Series(
-        {p: s.split("/")[0] for p, s in perp_to_spot.items()}
-    )
-
     # Add links to symbols
     # if exchange.name.lower() == "bybit":
     #     links = {symbol: f"https://www.bybit.com/trade/usdt/{symbol}?affiliate_id=7NDOBW" for symbol in cash_and_carry.index}
@@ -552,26 +926,29 @@ async def get_cash_and_carry(exchange: str, prices: bool):
     # Check to fetch price data too
     show_cols = ["funding rate [%]", "annualised rate [%]"]
     if prices:
-        # Get prices for perp and spot
-        perp_prices = get_prices(exchange, symbols=list(perp_to_spot.keys()))
-        spot_prices = get_prices(exchange, symbols=list(perp_to_spot.values()))
+        # Get prices for perp and spot in a single batch
         click.echo("Searching for opportunities...")
-        perp_prices, spot_prices = await asyncio.gather(perp_prices, spot_prices)
+        symbol_prices = await get_prices(
+            exchange, symbols=[*perp_to_spot.keys(), *perp_to_spot.values()]
+        )
 
-        # Reindex spot by the perp symbol
-        spot_prices_by_perp = {p: spot_prices[s] for p, s in perp_to_spot.items()}
+        # Look up the perp and spot prices for each perp symbol, in order
+        perp_price = cash_and_carry.index.map(symbol_prices).to_numpy(dtype=float)
+        spot_price = (
+            cash_and_carry.index.map(perp_to_spot)
+            .map(symbol_prices)
+            .to_numpy(dtype=float)
+        )
 
-        # Add price columns
+        # Add price columns and discount/premium column
         # TODO - fix display format
-        cash_and_carry["perp price"] = pd.Series(perp_prices)
-        cash_and_carry["spot price"] = pd.Series(spot_prices_by_perp)
-
-        # Add discount/premium colum
-        # TODO - change this to be more readable
-        cash_and_carry["premium"] = (
-            100
-            * (cash_and_carry["perp price"] - cash_and_carry["spot price"])
-            / cash_and_carry["spot price"]
+        # TODO - change premium to be more readable
+        cash_and_carry = cash_and_carry.assign(
+            **{
+                "perp price": perp_price,
+                "spot price": spot_price,
+                "premium": 100 * (perp_price - spot_price) / spot_price,
+            }
         )
 
         # Update columns to be shown
@@ -586,14 +963,13 @@ async def get_cash_and_carry(exchange: str, prices: bool):
     return cash_and_carry[show_cols]
 
 
-def update_config(config_filepath: str, update_time: Optional[bool] = True, **kwargs):
+def update_config(config_filepath: str, **kwargs):
     """Update the configuration file."""
-    # Check for existing file
-    if os.path.exists(config_filepath):
+    try:
         # Load existing config
         with open(config_filepath, "r") as f:
             config = json.load(f)
-    else:
+    except FileNotFoundError:
         # Config doesn't exist yet
         config = {}
 
@@ -607,17 +983,22 @@ def update_config(config_filepath: str, update_time: Optional[bool] = True, **kw
         else:
             config[k] = v
 
-    # Update latest time
-    if update_time:
-        config["last_update"] = f"{datetime.now().strftime(constants.STRFTIME)}"
-
-    # Dump updated config to file
-    with open(config_filepath, "w") as f:
-        json.dump(config, f, indent=2)
+    # Dump updated config
+    write_config(config_filepath, config)
 
     return config
 
 
+def write_config(config_filepath: str, config: dict):
+    """Write the configuration file."""
+    # Dump config to a temporary file, then move it into place so that an
+    # interrupted write cannot leave a truncated config behind
+    tmp_filepath = f"{config_filepath}.{os.getpid()}.tmp"
+    with open(tmp_filepath, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_filepath, config_filepath)
+
+
 def configure_keys(home_dir: str):
     """Configure exchange API keys."""
     # Create features exchanges links
@@ -674,16 +1055,17 @@ def configure_keys(home_dir: str):
                 ),
                 type=click.STRING,
             )
-            if exchange.lower() not in ccxt.exchanges:
+            if exchange.lower() not in get_exchanges():
                 click.echo("Invalid exchange. Please check spelling and try again.")
-            valid_exchange = True
+            else:
+                valid_exchange = True
 
         keys_config = update_keys_config(keys_config, exchange)
         write_yaml(keys_config, keys_filepath)
         clear_and_display(keys_config)
 
         # Continue
-        repeat = click.prompt(
+        repeat = click.confirm(
             text=click.style(
                 text="Would you like to configure another exchange?", fg="green"
             ),
@@ -753,7 +1135,6 @@ def manage_project_dir(home_dir: str):
                 # Add project directory to configuration file
                 config = update_config(
                     config_filepath=config_filepath,
-                    update_time=False,
                     project=(project_name, project_dir_path),
                 )
                 click.echo(f"Added {project_name} to your projects.")
@@ -775,8 +1156,7 @@ def manage_project_dir(home_dir: str):
                 config["projects"].pop(project_name)
 
                 # Write updated config
-                with open(config_filepath, "w") as f:
-                    json.dump(config, f, indent=2)
+                write_config(config_filepath, config)
 
                 click.echo(f"Removed {project_name} from your projects.")
                 click.pause()